@@ -11,6 +11,7 @@ class AudioConfig:
         FORMAT (int): The format of the audio data. This is set to pyaudio.paInt16, which is 16-bit signed little-endian.
         DEVICE_INDEX (Optional[int]): The index of the device to use for audio input. This is set to None.
         VAD_THRESHOLD (float): The threshold for voice activity detection.
+        VAD_THRESHOLD_Q15 (int): VAD_THRESHOLD on the int16 sample scale, compared against mean absolute sample values.
         SILENCE_THRESHOLD (float): The threshold for silence detection.
         MIN_PHRASE_MS (int): The minimum duration of a valid phrase in milliseconds.
         MAX_PHRASE_MS (int): The maximum duration of a phrase in milliseconds.
@@ -24,6 +25,7 @@ class AudioConfig:
     DEVICE_INDEX = None
     
     VAD_THRESHOLD = 0.003 # Try 0.01
+    VAD_THRESHOLD_Q15 = int(VAD_THRESHOLD * 32768)
     SILENCE_THRESHOLD = 0.002 # Try 0.01
     MIN_PHRASE_MS = 250  # Minimum milliseconds for a valid phrase
     MAX_PHRASE_MS = 10000  # Maximum milliseconds for a phrase
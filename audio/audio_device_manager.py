@@ -1,73 +1,88 @@
 import logging
-from typing import Optional
+from functools import cached_property
+from typing import Dict, List, Optional
 import pyaudio
 
 class AudioDeviceManager:
+    SEEED_NAMES = ('seeed', 'respeaker')  # Lowercase substrings identifying the HAT
+    
     def __init__(self, config, logger: Optional[logging.Logger] = None):
         self.config = config
         self.logger = logger or logging.getLogger(__name__)
         self.audio = None
         
+    @cached_property
+    def _device_infos(self) -> List[Dict]:
+        """Device info for every PortAudio device, enumerated once."""
+        device_infos = []
+        for i in range(self.audio.get_device_count()):
+            try:
+                device_infos.append(self.audio.get_device_info_by_index(i))
+            except Exception as e:
+                self.logger.warning(f"Error checking device {i}: {e}")
+        return device_infos
+    
+    @cached_property
+    def _device_names(self) -> Dict[int, str]:
+        """Lowercased device names by index, so matching does not re-lower them."""
+        return {d['index']: d.get('name', '').lower() for d in self._device_infos}
+    
+    def _is_seeed(self, dev_info: Dict) -> bool:
+        """Whether a device's name identifies it as a Seeed ReSpeaker."""
+        name = self._device_names[dev_info['index']]
+        return any(seeed in name for seeed in self.SEEED_NAMES)
+    
+    @cached_property
+    def _host_api_names(self) -> Dict[int, str]:
+        """Names of the host APIs the devices belong to, queried once per API."""
+        names = {}
+        for dev_info in self._device_infos:
+            host_api = dev_info['hostApi']
+            if host_api not in names:
+                try:
+                    names[host_api] = self.audio.get_host_api_info_by_index(host_api)['name']
+                except Exception:
+                    names[host_api] = ''
+        return names
+    
+    def invalidate_cache(self):
+        """Forget the cached device list, e.g. after a device was hotplugged."""
+        self.__dict__.pop('_device_infos', None)
+        self.__dict__.pop('_device_names', None)
+        self.__dict__.pop('_host_api_names', None)
+        
     def setup_devices(self):
         """Set up audio device focusing on hardware devices."""
         try:
             self.logger.info("\nScanning for audio devices...")
             
-            # Look specifically for the Seeed device at hw:0,0
             found_device = False
             
-            # Try to open the hardware device directly
-            try:
-                test_stream = self.audio.open(
-                    format=self.config.FORMAT,
-                    channels=self.config.CHANNELS,
-                    rate=self.config.RATE,
-                    input=True,
-                    input_device_index=0,  # Try hardware device 0
-                    frames_per_buffer=self.config.CHUNK,
-                    start=False
-                )
-                test_stream.close()
-                self.config.DEVICE_INDEX = 0
-                found_device = True
-                self.logger.info("Successfully opened hardware device at index 0")
-                return
+            # Only test-open plausible devices, most likely first; opening a
+            # stream is slow and can leave ALSA devices busy
+            for dev_info in self._rank_candidates():
+                i = dev_info['index']
+                name = self._device_names[i]
+                self.logger.info(f"\nChecking device {i}: {name}")
                 
-            except Exception as e:
-                self.logger.warning(f"Could not open hardware device directly: {e}")
-            
-            # If direct hardware access failed, try scanning devices
-            if not found_device:
-                for i in range(self.audio.get_device_count()):
-                    try:
-                        dev_info = self.audio.get_device_info_by_index(i)
-                        name = dev_info.get('name', '').lower()
-                        
-                        self.logger.info(f"\nChecking device {i}: {name}")
-                        
-                        # Look for hardware or Seeed device
-                        if ('hw:' in name or 'seeed' in name) and dev_info['maxInputChannels'] > 0:
-                            try:
-                                test_stream = self.audio.open(
-                                    format=self.config.FORMAT,
-                                    channels=self.config.CHANNELS,
-                                    rate=self.config.RATE,
-                                    input=True,
-                                    input_device_index=i,
-                                    frames_per_buffer=self.config.CHUNK,
-                                    start=False
-                                )
-                                test_stream.close()
-                                self.config.DEVICE_INDEX = i
-                                found_device = True
-                                self.logger.info(f"Successfully configured device: {name}")
-                                return
-                                
-                            except Exception as e:
-                                self.logger.warning(f"Could not open device {i}: {e}")
-                                
-                    except Exception as e:
-                        self.logger.warning(f"Error checking device {i}: {e}")
+                try:
+                    test_stream = self.audio.open(
+                        format=self.config.FORMAT,
+                        channels=self.config.CHANNELS,
+                        rate=self.config.RATE,
+                        input=True,
+                        input_device_index=i,
+                        frames_per_buffer=self.config.CHUNK,
+                        start=False
+                    )
+                    test_stream.close()
+                    self.config.DEVICE_INDEX = i
+                    found_device = True
+                    self.logger.info(f"Successfully configured device: {name}")
+                    return
+                    
+                except Exception as e:
+                    self.logger.warning(f"Could not open device {i}: {e}")
             
             if not found_device:
                 self.logger.error("\nCould not find working input device!")
@@ -82,11 +97,35 @@ class AudioDeviceManager:
             self.logger.error(f"Device setup failed: {str(e)}")
             raise
             
+    def _rank_candidates(self) -> List[Dict]:
+        """Return hardware or Seeed input devices able to record CHANNELS, best first."""
+        candidates = []
+        for dev_info in self._device_infos:
+            if not ('hw:' in self._device_names[dev_info['index']] or self._is_seeed(dev_info)):
+                continue
+            if dev_info['maxInputChannels'] < self.config.CHANNELS:
+                continue
+            candidates.append(dev_info)
+        
+        # Prefer direct ALSA devices over other host APIs when any are present
+        alsa = [d for d in candidates if self._host_api_names.get(d['hostApi']) == 'ALSA']
+        if alsa:
+            candidates = alsa
+        
+        def rank(dev_info):
+            return (
+                self._is_seeed(dev_info),
+                'hw:' in self._device_names[dev_info['index']],
+                int(dev_info['defaultSampleRate']) == self.config.RATE,
+            )
+        
+        return sorted(candidates, key=rank, reverse=True)
+    
     def log_available_devices(self):
         """Log information about all available audio devices"""
         self.logger.info("Available audio devices:")
-        for i in range(self.audio.get_device_count()):
-            dev_info = self.audio.get_device_info_by_index(i)
+        for dev_info in self._device_infos:
+            i = dev_info['index']
             self.logger.debug(
                 f"Device {i}: {dev_info['name']}\n"
                 f"  Max Input Channels: {dev_info['maxInputChannels']}\n"
@@ -106,12 +145,11 @@ class AudioDeviceManager:
     def find_seeed_device(self):
         """Find Seeed ReSpeaker device if available."""
         try:
-            for i in range(self.audio.get_device_count()):
-                dev_info = self.audio.get_device_info_by_index(i)
-                # Look for ReSpeaker in device name (case insensitive)
-                if any(name in dev_info['name'].lower() for name in ['seeed', 'respeaker']):
-                    if dev_info['maxInputChannels'] > 0:  # Ensure it's an input device
-                        return dev_info
+            for dev_info in self._device_infos:
+                # Look for ReSpeaker in device name (case insensitive);
+                # the first input device that matches wins
+                if dev_info['maxInputChannels'] > 0 and self._is_seeed(dev_info):
+                    return dev_info
             return None
             
         except Exception as e:
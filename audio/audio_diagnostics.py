@@ -2,14 +2,16 @@
 
 import logging
 from typing import Optional
-import psutil
 import time
 from datetime import datetime
 from config_manager import LoggerConfig
 
+psutil = None  # Imported on first use, only needed in debug mode
+_now = time.monotonic  # Only used for intervals, unaffected by clock changes
+
 class AudioDiagnostics:
     def __init__(self, debug_mode: bool = False, logger: Optional[logging.Logger] = None):
-        self.start_time = time.time()
+        self.start_time = _now()
         self.last_check = self.start_time
         self.samples_processed = 0
         self.cpu_usage = []
@@ -23,18 +25,26 @@ class AudioDiagnostics:
         Args:
             sample_size: Number of samples processed
         """
-        current_time = time.time()
         self.samples_processed += sample_size
+        if not self.debug_mode:
+            return
         
-        if self.debug_mode and current_time - self.last_check >= 1.0:
+        current_time = _now()
+        if current_time - self.last_check >= 1.0:
+            global psutil
+            if psutil is None:
+                import psutil as _psutil
+                psutil = _psutil
+            
             cpu_percent = psutil.cpu_percent(interval=None)
             self.cpu_usage.append(cpu_percent)
             
-            self.logger.debug(
-                f"\nDiagnostics at {datetime.now().strftime('%H:%M:%S')}:\n"
-                f"- CPU Usage: {cpu_percent}%\n"
-                f"- Samples processed: {self.samples_processed}\n"
-                f"- Time running: {int(current_time - self.start_time)}s\n"
-                f"- Sample rate actual: {self.samples_processed / (current_time - self.start_time):.2f} Hz"
-            )
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(
+                    f"\nDiagnostics at {datetime.now().strftime('%H:%M:%S')}:\n"
+                    f"- CPU Usage: {cpu_percent}%\n"
+                    f"- Samples processed: {self.samples_processed}\n"
+                    f"- Time running: {int(current_time - self.start_time)}s\n"
+                    f"- Sample rate actual: {self.samples_processed / (current_time - self.start_time):.2f} Hz"
+                )
             self.last_check = current_time
\ No newline at end of file
@@ -0,0 +1,74 @@
+# audio_kernels.py
+
+from typing import Callable, Optional, Tuple
+import logging
+
+import numpy as np
+
+def _downmix_vad_loop(pcm, channels, out, threshold_q15):
+    """Single-pass downmix and VAD, written as a loop for Numba to compile."""
+    n = pcm.shape[0] // channels
+    acc = 0
+    if channels == 2:
+        for i in range(n):
+            m = (np.int32(pcm[2 * i]) + np.int32(pcm[2 * i + 1])) >> 1
+            out[i] = m
+            acc += abs(m)
+    else:
+        for i in range(n):
+            m = np.int32(pcm[i])
+            out[i] = m
+            acc += abs(m)
+    return n, acc, acc > threshold_q15 * n
+
+def _downmix_vad_numpy(pcm: np.ndarray, channels: int, out: np.ndarray,
+                       threshold_q15: int) -> Tuple[int, int, bool]:
+    """Vectorized fallback of the same kernel when Numba is not installed."""
+    if channels == 2:
+        mono = np.add(pcm[0::2], pcm[1::2], dtype=np.int32)
+        mono >>= 1
+        n = len(mono)
+        np.copyto(out[:n], mono)
+        np.abs(mono, out=mono)
+    else:
+        n = len(pcm)
+        np.copyto(out[:n], pcm)
+        mono = np.abs(out[:n], dtype=np.int32)
+    acc = int(mono.sum())
+    return n, acc, acc > threshold_q15 * n
+
+_downmix_vad = None
+
+def load_downmix_vad(logger: Optional[logging.Logger] = None) -> Callable:
+    """
+    Return the fused downmix + VAD kernel, compiling it on first call
+
+    downmix_vad(pcm, channels, out, threshold_q15) writes the mono int16
+    signal of interleaved pcm into out and returns (samples, abs_sum, is_voice),
+    where is_voice means the mean absolute level exceeds threshold_q15.
+
+    Args:
+        logger: Logger used to report which implementation is in use
+
+    Returns:
+        Callable: Numba-compiled kernel, or the NumPy fallback
+    """
+    global _downmix_vad
+    if _downmix_vad is None:
+        logger = logger or logging.getLogger(__name__)
+        try:
+            # Imported here so Numba's startup cost is only paid when streaming
+            from numba import njit
+            kernel = njit(cache=True)(_downmix_vad_loop)
+            # Compile (or load from cache) now rather than on the first chunk
+            kernel(np.zeros(2, dtype=np.int16), 2, np.empty(1, dtype=np.int16), 0)
+            _downmix_vad = kernel
+            logger.debug("Using Numba audio kernels")
+        except ImportError:
+            _downmix_vad = _downmix_vad_numpy
+            logger.debug("Numba not available, using NumPy audio kernels")
+        except Exception as e:
+            # Typing/lowering, LLVM or cache errors: the NumPy kernel still works
+            _downmix_vad = _downmix_vad_numpy
+            logger.warning(f"Numba kernel compilation failed, using NumPy audio kernels: {e}")
+    return _downmix_vad
@@ -1,59 +1,194 @@
 import numpy as np
+from math import gcd
 from typing import Optional
-import json
+import orjson
+
+try:
+    from scipy import signal
+except ImportError:
+    signal = None
+
+INV_32768 = np.float32(1.0 / 32768.0)
 
 class AudioProcessor:
+    # Anti-aliasing FIR taps for resample_poly, keyed by (up, down)
+    _resample_taps = {}
+    # Front-padded low-pass taps for integer decimation, keyed by (factor, delay)
+    _decimation_taps = {}
+    DECIMATION_NUMTAPS = 33
+
     def __init__(self, config, logger):
         self.config = config
         self.logger = logger
         self._last_partial = None
+        
+        # High-pass filter design is constant, so do it once
+        self._hp_sos = None
+        if signal is not None:
+            try:
+                self._hp_sos = signal.butter(
+                    4, 80.0/(self.config.RATE/2.0), btype='high', output='sos'
+                )
+            except ValueError as e:
+                self.logger.warning(f"High-pass filter disabled: {str(e)}")
+        
+        # Streaming decimation for the live recognizer path, used when RATE is
+        # an integer multiple of VOSK_RATE; otherwise audio stays at RATE
+        self.stream_rate = self.config.RATE
+        self._stream_factor = 1
+        if (signal is not None and self.config.RATE > self.config.VOSK_RATE
+                and self.config.RATE % self.config.VOSK_RATE == 0):
+            factor = self.config.RATE // self.config.VOSK_RATE
+            # Padded so the filter history is a whole number of output samples
+            self._stream_taps = self._get_decimation_taps(factor, self.DECIMATION_NUMTAPS - 1)
+            self._stream_history = np.zeros(len(self._stream_taps) - 1, dtype=np.int16)
+            self._stream_phase = 0  # Chunk offset of the next kept input sample
+            self._stream_factor = factor
+            self.stream_rate = self.config.VOSK_RATE
 
     def resample_audio(self, audio_data):
         """Resample audio from 48kHz to 16kHz with improved quality"""
         try:
             # Ensure audio_data is the right shape
             if len(audio_data.shape) > 1:
-                audio_data = audio_data.mean(axis=1)
+                # Integer downmix, avoids a float64 copy of the whole buffer
+                if audio_data.shape[1] == 2:
+                    mono = audio_data[:, 0].astype(np.int32)
+                    mono += audio_data[:, 1]
+                    mono >>= 1
+                else:
+                    mono = audio_data.sum(axis=1, dtype=np.int32) // audio_data.shape[1]
+                audio_data = mono.astype(np.int16)
                 
-            resampling_factor = self.config.VOSK_RATE / self.config.RATE
-            resampled_len = int(len(audio_data) * resampling_factor)
+            # Rational ratio, e.g. 48000 -> 16000 is up=1, down=3
+            divisor = gcd(self.config.VOSK_RATE, self.config.RATE)
+            up = self.config.VOSK_RATE // divisor
+            down = self.config.RATE // divisor
+            if up == down:
+                return audio_data.astype(np.int16, copy=False)
             
-            # Use scipy.signal.resample for better quality
-            from scipy import signal
-            resampled_data = signal.resample(audio_data, resampled_len)
+            if up == 1:
+                # Integer ratio (48 kHz -> 16 kHz): short low-pass that only
+                # computes the samples kept after decimation
+                # Slicing off the padded filter delay keeps the output
+                # aligned like resample_poly
+                delay = (self.DECIMATION_NUMTAPS - 1) // 2
+                taps = self._get_decimation_taps(down, delay)
+                skip = -(-delay // down)
+                out_len = -(-len(audio_data) // down)
+                resampled_data = signal.upfirdn(taps, audio_data, 1, down)[skip:skip + out_len]
+            else:
+                # Polyphase FIR resampling, no per-chunk FFT
+                taps = self._get_resample_taps(up, down)
+                resampled_data = signal.resample_poly(audio_data, up, down, window=taps)
             
             # Ensure output is in the correct range
-            resampled_data = np.clip(resampled_data, -32768, 32767)
+            np.clip(resampled_data, -32768, 32767, out=resampled_data)
             return resampled_data.astype(np.int16)
             
         except Exception as e:
             self.logger.error(f"Resampling error: {str(e)}")
             return audio_data  # Return original data if resampling fails
 
+    def decimate_chunk(self, audio_data: np.ndarray, keep_output: bool = True) -> Optional[np.ndarray]:
+        """
+        Decimate one chunk of a continuous mono stream from RATE to stream_rate
+        
+        Filter history and decimation phase carry over between calls, so chunk
+        edges do not produce artifacts. Must only be called from one thread.
+        
+        Args:
+            audio_data: Next int16 chunk of the stream
+            keep_output: If False, only advance the filter state (for chunks
+                that are not forwarded to the recognizer)
+            
+        Returns:
+            Optional[np.ndarray]: Decimated int16 samples, or None if
+                keep_output is False or the chunk yields no output sample
+        """
+        factor = self._stream_factor
+        if factor == 1:
+            # No decimator was set up (scipy missing, or RATE not a multiple
+            # of VOSK_RATE), so stream_rate is RATE and the chunk passes through
+            return audio_data if keep_output else None
+        history_len = len(self._stream_history)
+        n = len(audio_data)
+        phase = self._stream_phase
+        count = max(0, -(-(n - phase) // factor))
+        
+        output = None
+        if keep_output and count:
+            extended = np.concatenate((self._stream_history, audio_data))
+            # Outputs before skip would only see the zero-padded start
+            skip = history_len // factor
+            output = signal.upfirdn(self._stream_taps, extended[phase:], 1, factor)[skip:skip + count]
+            np.clip(output, -32768, 32767, out=output)
+            output = output.astype(np.int16)
+        
+        # Carry the last history_len samples and the phase into the next chunk
+        if n >= history_len:
+            self._stream_history[:] = audio_data[n - history_len:]
+        else:
+            self._stream_history = np.concatenate((self._stream_history[n:], audio_data))
+        self._stream_phase = phase + count * factor - n
+        return output
+
+    @classmethod
+    def _get_resample_taps(cls, up: int, down: int) -> np.ndarray:
+        """Design the resampling low-pass filter once per ratio."""
+        taps = cls._resample_taps.get((up, down))
+        if taps is None:
+            # Same design resample_poly uses by default
+            max_rate = max(up, down)
+            taps = signal.firwin(20 * max_rate + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+            cls._resample_taps[(up, down)] = taps
+        return taps
+
+    @classmethod
+    def _get_decimation_taps(cls, factor: int, delay: int) -> np.ndarray:
+        """
+        Design the decimation low-pass filter once per factor and delay
+        
+        The taps are zero-padded at the front so that delay input samples
+        span a whole number of output samples.
+        """
+        taps = cls._decimation_taps.get((factor, delay))
+        if taps is None:
+            # Cutoff just under the output Nyquist (7.5 kHz for 48 kHz -> 16 kHz)
+            taps = signal.firwin(cls.DECIMATION_NUMTAPS, 0.9375 / factor)
+            taps = np.concatenate((np.zeros(-delay % factor), taps))
+            cls._decimation_taps[(factor, delay)] = taps
+        return taps
+
     def preprocess_audio(self, audio_data: np.ndarray) -> np.ndarray:
         """Enhanced audio preprocessing."""
         try:
-            # Convert to float32 for processing
-            audio_float = audio_data.astype(np.float32) / 32768.0
+            # Silent chunks would come out of the noise gate as silence anyway
+            if len(audio_data) == 0:
+                return audio_data
+            peak = max(int(audio_data.max()), -int(audio_data.min()))
+            if peak < self.config.SILENCE_THRESHOLD * 32768:
+                return audio_data
             
-            # Noise reduction
-            noise_floor = np.mean(np.abs(audio_float[audio_float < self.config.VAD_THRESHOLD]))
-            audio_float = np.where(
-                np.abs(audio_float) < noise_floor * 2,
-                0,
-                audio_float
-            )
+            # Convert to float32 for processing, scaling in place
+            audio_float = audio_data.astype(np.float32)
+            audio_float *= INV_32768
+            
+            # Noise reduction: floor is the mean magnitude of sub-threshold samples
+            abs_float = np.abs(audio_float)
+            quiet = abs_float < self.config.VAD_THRESHOLD
+            noise_floor = abs_float[quiet].mean() if quiet.any() else 0.0
+            
+            # Zero everything below twice the floor, in place
+            np.multiply(audio_float, abs_float >= noise_floor * 2, out=audio_float)
             
             # Optional: Add high-pass filter if scipy is available
-            try:
-                from scipy import signal
-                b, a = signal.butter(4, 80.0/(self.config.RATE/2.0), btype='high')
-                audio_float = signal.filtfilt(b, a, audio_float)
-            except ImportError:
-                pass
+            if self._hp_sos is not None:
+                audio_float = signal.sosfiltfilt(self._hp_sos, audio_float)
             
             # Convert back to int16
-            return (audio_float * 32768.0).astype(np.int16)
+            audio_float *= 32768.0
+            return audio_float.astype(np.int16)
             
         except Exception as e:
             self.logger.error(f"Error in audio preprocessing: {str(e)}")
@@ -61,7 +196,7 @@ class AudioProcessor:
 
     def process_recognition_result(self, recognizer) -> Optional[str]:
         """Process audio with configuration-based thresholds."""
-        result = json.loads(recognizer.Result())
+        result = orjson.loads(recognizer.Result())
         text = result.get("text", "").strip()
         if text:
             # Don't return single-word responses unless they're common expressions
@@ -71,8 +206,7 @@ class AudioProcessor:
 
     def process_partial_result(self, recognizer) -> Optional[str]:
         """Process partial recognition results."""
-        partial = json.loads(recognizer.PartialResult())
-        partial_text = partial.get("partial", "").strip()
+        partial_text = self._extract_partial(recognizer.PartialResult()).strip()
         
         # Use configured thresholds for partial results
         if (partial_text and 
@@ -81,4 +215,20 @@ class AudioProcessor:
             
             self._last_partial = partial_text
             return f"(Partial) {partial_text}"
-        return None
\ No newline at end of file
+        return None
+
+    @staticmethod
+    def _extract_partial(partial_json: str) -> str:
+        """Pull the text out of Vosk's {"partial" : "..."} without a full JSON parse."""
+        key = partial_json.find('"partial"')
+        if key != -1:
+            colon = partial_json.find(':', key + len('"partial"'))
+            if colon != -1:
+                start = partial_json.find('"', colon + 1)
+                end = partial_json.rfind('"')
+                if start != -1 and end > start:
+                    text = partial_json[start + 1:end]
+                    # Escapes or extra keys need the real parser
+                    if '\\' not in text and '"' not in text:
+                        return text
+        return orjson.loads(partial_json).get("partial", "")
@@ -1,63 +1,362 @@
+from dataclasses import dataclass, field
+from multiprocessing.shared_memory import SharedMemory
+import os
+import queue
+import threading
+import time
+
 import numpy as np
 import pyaudio
 
+from audio.audio_kernels import load_downmix_vad
+
+@dataclass
+class SpeakingState:
+    """Phrase tracking state for AudioStreamHandler.update_speaking_state."""
+    voice_frames: int = 0
+    silence_frames: int = 0
+    is_speaking: bool = False
+    last_phrase_end: float = 0.0
+    audio_buffer: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int16))
+    buf_len: int = 0  # Valid samples in audio_buffer
+
+def set_thread_scheduling(logger, cpus=None, priority=None):
+    """
+    Pin the calling thread to cpus and/or give it SCHED_FIFO priority
+    
+    Both are Linux-only and SCHED_FIFO needs root (or CAP_SYS_NICE); when
+    unavailable the thread keeps its default scheduling.
+    """
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+            logger.debug(f"Pinned thread {threading.get_native_id()} to CPUs {sorted(cpus)}")
+        except (AttributeError, OSError) as e:
+            logger.warning(f"Could not set CPU affinity {sorted(cpus)}: {e}")
+    if priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            logger.debug(f"Thread {threading.get_native_id()} running SCHED_FIFO at priority {priority}")
+        except (AttributeError, OSError) as e:
+            logger.warning(f"Could not set realtime priority {priority}: {e}")
+
 class AudioStreamHandler:
-    def __init__(self, config, audio_queue, logger):
+    RING_SLOTS = 8  # Chunks the callback can get ahead of the worker
+    POOL_BUFFERS = 16  # Mono chunks that can be queued for recognition
+
+    def __init__(self, config, audio_queue, logger, audio_event=None, shared_memory=False,
+                 audio_processor=None, audio_cpus=None, realtime_priority=None):
         self.config = config
         self.audio_queue = audio_queue
+        self.audio_event = audio_event or threading.Event()
         self.logger = logger
+        # Decimates queued audio to the recognizer rate when it differs from RATE
+        self.audio_processor = audio_processor
+        self._decimate = (
+            audio_processor is not None and audio_processor.stream_rate != self.config.RATE
+        )
+        # VAD threshold as an int16-scale mean absolute level
+        self._vad_threshold_q15 = self.config.VAD_THRESHOLD_Q15
+        self._downmix_vad = None  # Resolved in start()
+        self._ms_per_sample = 1000.0 / self.config.RATE
+        # Applied to the capture threads so a decoder burst on another core
+        # cannot delay them (see set_thread_scheduling)
+        self.audio_cpus = audio_cpus
+        self.realtime_priority = realtime_priority
+        
+        # Single-producer/single-consumer ring of raw interleaved PCM.
+        # The PortAudio callback only copies into it; the worker thread
+        # does downmix and VAD.
+        self._ring = np.empty(
+            (self.RING_SLOTS, self.config.CHUNK * self.config.CHANNELS), dtype=np.int16
+        )
+        # Byte views of each slot so the callback can copy in_data without
+        # wrapping it in a new ndarray
+        self._ring_views = [memoryview(row).cast('B') for row in self._ring]
+        self._ring_lengths = [0] * self.RING_SLOTS
+        self._write_index = 0  # Only advanced by the callback
+        self._read_index = 0  # Only advanced by the worker
+        # Drop counts, one per writer thread so neither increment can be lost
+        self._ring_drops = 0  # Only written by the callback
+        self._pool_drops = 0  # Only written by the worker
+        self._data_ready = threading.Event()
+        self._running = False
+        self._worker = None
+        
+        # Recycled mono buffers handed to the consumer via audio_queue. With
+        # shared_memory they are views into one SharedMemory block, so a
+        # recognizer process can attach by name and read a slot without
+        # pickling the audio.
+        self.shared_memory = None
+        pool_shape = (self.POOL_BUFFERS, self.config.CHUNK)
+        if shared_memory:
+            self.shared_memory = SharedMemory(
+                create=True, size=self.POOL_BUFFERS * self.config.CHUNK * np.dtype(np.int16).itemsize
+            )
+            self._pool_block = np.ndarray(pool_shape, dtype=np.int16, buffer=self.shared_memory.buf)
+        else:
+            self._pool_block = np.empty(pool_shape, dtype=np.int16)
+        self._buffer_pool = queue.LifoQueue()
+        for buf in self._pool_block:
+            self._buffer_pool.put(buf)
+
+    def start(self, ringbuffer=None):
+        """
+        Start the worker thread that consumes captured audio
+        
+        Args:
+            ringbuffer: Optional rtmixer.RingBuffer of float32 frames filled by an
+                rtmixer.Recorder. If given, the worker reads from it and
+                the PortAudio stream callback is unused.
+        """
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._downmix_vad = load_downmix_vad(self.logger)
+        self._running = True
+        if ringbuffer is None:
+            target, args = self._process_loop, ()
+        else:
+            target, args = self._process_ringbuffer_loop, (ringbuffer,)
+        self._worker = threading.Thread(target=target, args=args, name="AudioWorker", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        """Stop the worker thread and discard unread chunks."""
+        self._running = False
+        self._data_ready.set()
+        if self._worker is not None:
+            self._worker.join(timeout=1.0)
+            if self._worker.is_alive():
+                # _read_index and the pool buffers still belong to the worker
+                self.logger.warning("Audio worker did not stop within 1s, leaving its state alone")
+                return
+            self._worker = None
+        self._read_index = self._write_index
+
+    def release_buffer(self, buf: np.ndarray):
+        """Return a buffer taken from audio_queue to the pool."""
+        self._buffer_pool.put(buf)
+
+    @property
+    def dropped_chunks(self) -> int:
+        """Chunks dropped so far because the ring or the buffer pool was full."""
+        return self._ring_drops + self._pool_drops
+
+    @property
+    def shared_memory_name(self):
+        """Name another process passes to attach_shared_buffers, or None."""
+        return None if self.shared_memory is None else self.shared_memory.name
+
+    def buffer_slot(self, buf: np.ndarray) -> int:
+        """Index of a pooled buffer within the pool block (and shared memory)."""
+        offset = buf.ctypes.data - self._pool_block.ctypes.data
+        return offset // self._pool_block.strides[0]
 
-    def audio_callback(self, in_data, frame_count, time_info, status):
-        """Simplified but robust audio callback."""
+    def close(self):
+        """Release the shared-memory pool, if one was created."""
+        if self.shared_memory is None:
+            return
+        if self._worker is not None and self._worker.is_alive():
+            self.logger.warning("Audio worker still running, not releasing shared audio buffers")
+            return
+        # Drop every numpy view first, SharedMemory refuses to close otherwise
+        self.audio_queue.clear()
+        self._buffer_pool = queue.LifoQueue()
+        self._pool_block = None
         try:
-            # Convert to numpy array (maintain int16 format)
-            audio_data = np.frombuffer(in_data, dtype=np.int16)
-            
-            # For stereo, convert to mono
-            if self.config.CHANNELS == 2:
-                audio_data = audio_data.reshape(-1, 2).mean(axis=1).astype(np.int16)
+            self.shared_memory.close()
+        except BufferError as e:
+            self.logger.warning(f"Shared audio buffers still in use: {e}")
+        self.shared_memory.unlink()
+        self.shared_memory = None
+
+    def make_audio_callback(self):
+        """
+        Build the PortAudio stream callback
+        
+        Everything the callback uses apart from the ring indices is bound to
+        closure locals here, so each realtime call skips those attribute lookups.
+        """
+        handler = self
+        ring_views = self._ring_views
+        ring_lengths = self._ring_lengths
+        slots = self.RING_SLOTS
+        wake_worker = self._data_ready.set
+        continue_result = (None, pyaudio.paContinue)
+        # PortAudio creates its callback thread itself, so it can only be
+        # tuned from inside the first call
+        tune_thread = bool(self.audio_cpus) or self.realtime_priority is not None
+        
+        def audio_callback(in_data, frame_count, time_info, status):
+            """Realtime callback: copy raw PCM into the ring and wake the worker."""
+            nonlocal tune_thread
+            try:
+                if tune_thread:
+                    tune_thread = False
+                    set_thread_scheduling(handler.logger, handler.audio_cpus, handler.realtime_priority)
+                
+                write_index = handler._write_index
+                if write_index - handler._read_index >= slots:
+                    # Worker fell behind, drop this chunk rather than block
+                    handler._ring_drops += 1
+                    return continue_result
+                
+                slot = write_index % slots
+                view = ring_views[slot]
+                nbytes = min(len(in_data), len(view))
+                view[:nbytes] = memoryview(in_data)[:nbytes]
+                ring_lengths[slot] = nbytes // 2  # int16 samples
+                handler._write_index = write_index + 1
+                wake_worker()
+                
+                return continue_result
+                
+            except Exception as e:
+                handler.logger.error(f"Error in audio callback: {str(e)}")
+                return (None, pyaudio.paComplete)
+        
+        return audio_callback
+
+    def _process_loop(self):
+        """Worker loop draining the ring buffer."""
+        set_thread_scheduling(self.logger, self.audio_cpus)
+        reported_drops = 0
+        while self._running:
+            if not self._data_ready.wait(timeout=0.1):
+                continue
+            self._data_ready.clear()
             
-            # Simple voice activity detection
-            audio_level = np.abs(audio_data).mean() / 32768.0
-            if audio_level > self.config.VAD_THRESHOLD:
-                self.audio_queue.put(audio_data.copy())
+            while self._running and self._read_index < self._write_index:
+                slot = self._read_index % self.RING_SLOTS
+                try:
+                    self._process_chunk(self._ring[slot, :self._ring_lengths[slot]])
+                except Exception as e:
+                    self.logger.error(f"Error processing audio chunk: {str(e)}")
+                self._read_index += 1
             
-            return (None, pyaudio.paContinue)
+            dropped = self.dropped_chunks
+            if dropped != reported_drops:
+                self.logger.warning(
+                    f"Audio pipeline fell behind, dropped {dropped - reported_drops} chunk(s)"
+                )
+                reported_drops = dropped
+
+    def _process_ringbuffer_loop(self, ringbuffer):
+        """Worker loop reading whole chunks from an rtmixer ring buffer."""
+        # rtmixer copies in its C callback, so there is no event to wait on;
+        # poll at twice the chunk rate. It records float32, which is scaled
+        # back to int16 into slot 0 of our ring.
+        set_thread_scheduling(self.logger, self.audio_cpus)
+        poll_interval = self.config.CHUNK / self.config.RATE / 2
+        float_buf = np.empty(self.config.CHUNK * self.config.CHANNELS, dtype=np.float32)
+        while self._running:
+            if ringbuffer.read_available < self.config.CHUNK:
+                time.sleep(poll_interval)
+                continue
             
-        except Exception as e:
-            self.logger.error(f"Error in audio callback: {str(e)}")
-            return (None, pyaudio.paComplete)
+            samples = ringbuffer.readinto(float_buf) * self.config.CHANNELS
+            try:
+                pcm = float_buf[:samples]
+                pcm *= 32768.0
+                np.clip(pcm, -32768, 32767, out=pcm)
+                self._ring[0, :samples] = pcm
+                self._process_chunk(self._ring[0, :samples])
+            except Exception as e:
+                self.logger.error(f"Error processing audio chunk: {str(e)}")
 
-    def update_speaking_state(self, is_voice: bool, audio_data: np.ndarray, state_data: dict) -> bool:
-        """Enhanced speaking state detection with phrase boundary handling."""
-        import time
+    def _process_chunk(self, audio_data: np.ndarray):
+        """Downmix (and decimate) one chunk and queue it as (buffer, length) if it contains voice."""
+        try:
+            buf = self._buffer_pool.get_nowait()
+        except queue.Empty:
+            # Consumer is behind: drop the oldest queued chunk and reuse its
+            # buffer, so latency stays bounded instead of growing stale
+            try:
+                buf, _ = self.audio_queue.popleft()
+            except IndexError:
+                # Consumer holds every buffer, drop this chunk instead
+                self._pool_drops += 1
+                return
+            self._pool_drops += 1
         
+        # Downmix into the pooled buffer and run VAD in one pass
+        n, _, is_voice = self._downmix_vad(
+            audio_data, self.config.CHANNELS, buf, self._vad_threshold_q15
+        )
+        
+        # Every chunk advances the decimator so its filter state stays
+        # continuous, but only voiced chunks are actually filtered
+        if self._decimate:
+            decimated = self.audio_processor.decimate_chunk(buf[:n], keep_output=is_voice)
+            if decimated is None:
+                is_voice = False
+            else:
+                n = len(decimated)
+                buf[:n] = decimated
+        
+        if is_voice:
+            self.audio_queue.append((buf, n))
+            self.audio_event.set()
+        else:
+            self._buffer_pool.put(buf)
+
+    def new_speaking_state(self) -> SpeakingState:
+        """Create a SpeakingState whose buffer holds MAX_PHRASE_MS of audio."""
+        max_samples = int(self.config.MAX_PHRASE_MS * self.config.RATE / 1000)
+        return SpeakingState(audio_buffer=np.empty(max_samples, dtype=np.int16))
+
+    def update_speaking_state(self, is_voice: bool, audio_data: np.ndarray, state: SpeakingState) -> bool:
+        """Enhanced speaking state detection with phrase boundary handling."""
         current_time = time.time()
-        samples_to_ms = lambda x: (x * 1000) / self.config.RATE
+        ms_per_sample = self._ms_per_sample
         
         if is_voice:
-            state_data['voice_frames'] += len(audio_data)
-            state_data['silence_frames'] = 0
+            state.voice_frames += len(audio_data)
+            state.silence_frames = 0
             
-            if not state_data['is_speaking']:
-                if (current_time - state_data['last_phrase_end']) > 0.3:  # 300ms minimum gap
-                    state_data['is_speaking'] = True
-                    state_data['audio_buffer'] = []
+            if not state.is_speaking:
+                if (current_time - state.last_phrase_end) > 0.3:  # 300ms minimum gap
+                    state.is_speaking = True
+                    state.buf_len = 0
                     self.logger.debug("Started new phrase")
         else:
-            state_data['silence_frames'] += len(audio_data)
+            state.silence_frames += len(audio_data)
             
-            if state_data['is_speaking']:
-                if samples_to_ms(state_data['silence_frames']) > 300:  # 300ms silence
-                    if samples_to_ms(state_data['voice_frames']) > 250:  # 250ms minimum phrase
-                        state_data['is_speaking'] = False
-                        state_data['last_phrase_end'] = current_time
+            if state.is_speaking:
+                if state.silence_frames * ms_per_sample > 300:  # 300ms silence
+                    if state.voice_frames * ms_per_sample > 250:  # 250ms minimum phrase
+                        state.is_speaking = False
+                        state.last_phrase_end = current_time
                         self.logger.debug(
-                            f"Ended phrase - duration: {samples_to_ms(state_data['voice_frames']):.0f}ms"
+                            f"Ended phrase - duration: {state.voice_frames * ms_per_sample:.0f}ms"
                         )
                         return True
         
-        if state_data['is_speaking']:
-            state_data['audio_buffer'].extend(audio_data)
+        if state.is_speaking:
+            # Phrases longer than the buffer (MAX_PHRASE_MS) are truncated
+            start = state.buf_len
+            end = min(start + len(audio_data), len(state.audio_buffer))
+            state.audio_buffer[start:end] = audio_data[:end - start]
+            state.buf_len = end
+        
+        return False
+
+def attach_shared_buffers(name, chunk_size):
+    """
+    Attach to an AudioStreamHandler's shared buffer pool from another process
+    
+    A queued (buf, n) chunk is then readable as pool[slot, :n], where slot is
+    the producer's buffer_slot(buf). The producer owns the segment: delete
+    the pool view and close() the segment when done, but never unlink() it.
+    
+    Args:
+        name: The producer's shared_memory_name
+        chunk_size: CHUNK of the producer's AudioConfig
         
-        return False
\ No newline at end of file
+    Returns:
+        Tuple[SharedMemory, np.ndarray]: The attached segment and a
+            (POOL_BUFFERS, chunk_size) int16 view of it
+    """
+    shm = SharedMemory(name=name)
+    pool = np.ndarray((AudioStreamHandler.POOL_BUFFERS, chunk_size), dtype=np.int16, buffer=shm.buf)
+    return shm, pool
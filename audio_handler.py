@@ -1,11 +1,10 @@
 from collections import deque
 import logging
-import queue
+import threading
 from typing import Optional
 import os
 
 import pyaudio
-import numpy as np
 from vosk import Model, KaldiRecognizer
 
 from logger_config import LoggerConfig
@@ -13,10 +12,14 @@ from config_manager import ConfigManager
 from audio.audio_config import AudioConfig
 from audio.audio_device_manager import AudioDeviceManager
 from audio.audio_processor import AudioProcessor
-from audio.audio_stream_handler import AudioStreamHandler
-from setup_vosk_model import setup_vosk_model
+from audio.audio_stream_handler import AudioStreamHandler, set_thread_scheduling
+from setup_vosk_model import setup_vosk_model, prefetch_model_files
 
 class AudioHandler:
+    MAX_BATCH_CHUNKS = 4  # Queued chunks fed to the recognizer per call
+    MAX_BATCH_SECONDS = 0.5  # Stop adding chunks to a batch past this much audio
+    AUDIO_WAIT_TIMEOUT = 0.1  # Seconds process_audio waits for audio
+
     def __init__(self, config_path: Optional[str] = None):
         """Initialize AudioHandler with configuration."""
         # Initialize logger first
@@ -28,6 +31,13 @@ class AudioHandler:
         
         # Update debug mode from config
         self.debug_mode = self.config_manager.config.get("DEBUG_MODE", False)
+        self.audio_backend = self.config_manager.config.get("AUDIO_BACKEND", "pyaudio")
+        # Cores reserved for the Vosk decoder (this thread); capture threads
+        # get the rest
+        self.decoder_cpus = self._parse_cpu_ids(self.config_manager.config.get("DECODER_CPUS"))
+        audio_cpus = None
+        if self.decoder_cpus and hasattr(os, "sched_getaffinity"):
+            audio_cpus = os.sched_getaffinity(0) - self.decoder_cpus or None
         self.logger.setLevel(logging.DEBUG if self.debug_mode else logging.INFO)
         
         # Initialize components
@@ -35,7 +45,10 @@ class AudioHandler:
         self._update_config_from_manager()
         
         self.audio = pyaudio.PyAudio()
-        self.audio_queue = queue.Queue()
+        # Bounded by the stream handler's buffer pool; deque append/popleft
+        # are atomic, so no Queue locking is needed
+        self.audio_queue = deque(maxlen=AudioStreamHandler.POOL_BUFFERS)
+        self._audio_event = threading.Event()
         self.is_running = False
         self.stream = None
         
@@ -44,7 +57,15 @@ class AudioHandler:
         self.device_manager.audio = self.audio  # Share PyAudio instance
         
         self.audio_processor = AudioProcessor(self.config, self.logger)
-        self.stream_handler = AudioStreamHandler(self.config, self.audio_queue, self.logger)
+        self._max_batch_samples = int(self.audio_processor.stream_rate * self.MAX_BATCH_SECONDS)
+        self.stream_handler = AudioStreamHandler(
+            self.config, self.audio_queue, self.logger, audio_event=self._audio_event,
+            shared_memory=self.config_manager.config.get("SHARED_AUDIO_BUFFERS", False),
+            audio_processor=self.audio_processor, audio_cpus=audio_cpus,
+            realtime_priority=self.config_manager.config.get("AUDIO_THREAD_PRIORITY")
+        )
+        if self.stream_handler.shared_memory_name:
+            self.logger.info(f"Shared audio buffers: {self.stream_handler.shared_memory_name}")
         
         try:
             # Setup devices using device manager
@@ -58,6 +79,30 @@ class AudioHandler:
             self.cleanup()
             raise
 
+    def _parse_cpu_ids(self, value) -> set:
+        """
+        Normalise a CPU id config value to a set of valid ids
+        
+        None means no pinning, an int is a single CPU and a list is several.
+        Invalid ids are skipped with a warning.
+        """
+        if value is None:
+            return set()
+        if isinstance(value, int):
+            value = [value]
+        elif isinstance(value, str) or not hasattr(value, '__iter__'):
+            self.logger.warning(f"Ignoring DECODER_CPUS {value!r}, expected a CPU id or a list of them")
+            return set()
+        
+        cpu_count = os.cpu_count() or 1
+        cpus = set()
+        for cpu in value:
+            if isinstance(cpu, int) and not isinstance(cpu, bool) and 0 <= cpu < cpu_count:
+                cpus.add(cpu)
+            else:
+                self.logger.warning(f"Ignoring invalid CPU id {cpu!r} in DECODER_CPUS (have {cpu_count} CPUs)")
+        return cpus
+
     def _update_config_from_manager(self):
         """Update AudioConfig with values from ConfigManager."""
         audio_config = self.config_manager.get_audio_config()
@@ -67,6 +112,7 @@ class AudioHandler:
         self.config.CHANNELS = audio_config["CHANNELS"]
         self.config.CHUNK = audio_config["CHUNK"]
         self.config.VAD_THRESHOLD = audio_config["VAD_THRESHOLD"]
+        self.config.VAD_THRESHOLD_Q15 = int(self.config.VAD_THRESHOLD * 32768)
         
         # Keep format hardcoded for ReSpeaker compatibility
         self.config.FORMAT = pyaudio.paInt16
@@ -76,10 +122,17 @@ class AudioHandler:
     def _initialize_vosk(self):
         """Initialize Vosk speech recognition."""
         try:
-            model_path = setup_vosk_model(self.config_manager.get_model_path())
+            model_path = setup_vosk_model(
+                self.config_manager.get_model_path(),
+                expected_sha256=self.config_manager.get_model_sha256()
+            )
+            prefetch_model_files(model_path)
             self.model = Model(model_path)
-            self.recognizer = KaldiRecognizer(self.model, self.config.RATE)
-            self.recognizer.SetWords(True)
+            # Queued audio is decimated to VOSK_RATE when RATE allows it
+            self.recognizer = KaldiRecognizer(self.model, self.audio_processor.stream_rate)
+            # Only the "text" field is used; per-word timings would just bloat
+            # every Result() JSON that has to be parsed
+            self.recognizer.SetWords(False)
             self.logger.info("Vosk model initialized successfully")
         except Exception as e:
             self.logger.error(f"Error initializing speech recognition: {str(e)}")
@@ -88,6 +141,10 @@ class AudioHandler:
     def start_recording(self):
         """Start recording with proper error handling."""
         try:
+            if self.audio_backend == "rtmixer":
+                self._start_rtmixer_recording()
+                return
+            
             self.stream = self.audio.open(
                 format=self.config.FORMAT,
                 channels=self.config.CHANNELS,
@@ -95,11 +152,15 @@ class AudioHandler:
                 input=True,
                 input_device_index=self.config.DEVICE_INDEX,
                 frames_per_buffer=self.config.CHUNK,
-                stream_callback=self.stream_handler.audio_callback,
+                stream_callback=self.stream_handler.make_audio_callback(),
                 start=False
             )
             
+            self.stream_handler.start()
             self.stream.start_stream()
+            # Pinned only after the audio threads exist so they do not
+            # inherit the decoder's affinity
+            set_thread_scheduling(self.logger, self.decoder_cpus)
             self.is_running = True
             self.logger.info("Started recording successfully")
             
@@ -108,23 +169,71 @@ class AudioHandler:
             self.cleanup()
             raise
 
+    def _start_rtmixer_recording(self):
+        """Capture through rtmixer, which fills a ring buffer from C without the GIL."""
+        import rtmixer  # Optional dependency, only needed for this backend
+        
+        # rtmixer ring buffers hold a power-of-two number of frames
+        ring_frames = 1 << (AudioStreamHandler.RING_SLOTS * self.config.CHUNK - 1).bit_length()
+        # rtmixer always records float32 frames
+        ringbuffer = rtmixer.RingBuffer(self.config.CHANNELS * 4, ring_frames)
+        
+        self.stream = rtmixer.Recorder(
+            device=self.config.DEVICE_INDEX,
+            channels=self.config.CHANNELS,
+            samplerate=self.config.RATE,
+            blocksize=self.config.CHUNK
+        )
+        self.stream_handler.start(ringbuffer=ringbuffer)
+        self.stream.start()
+        self.stream.record_ringbuffer(ringbuffer)
+        set_thread_scheduling(self.logger, self.decoder_cpus)
+        self.is_running = True
+        self.logger.info("Started recording successfully (rtmixer)")
+
     def process_audio(self) -> Optional[str]:
         """Process audio and return recognized text."""
         try:
-            audio_data = self.audio_queue.get_nowait()
+            if not self.audio_queue:
+                # Block until the stream handler queues audio instead of
+                # letting the main loop spin. Re-check after clearing so a
+                # chunk queued in between is not missed.
+                self._audio_event.clear()
+                if not self.audio_queue:
+                    self._audio_event.wait(timeout=self.AUDIO_WAIT_TIMEOUT)
             
-            # Skip processing if audio is too quiet
-            if np.max(np.abs(audio_data)) < (self.config.VAD_THRESHOLD * 32768):
+            # Coalesce whatever is queued into one recognizer call, keeping
+            # the batch short enough that results are not delayed
+            batch = []
+            batch_samples = 0
+            for _ in range(self.MAX_BATCH_CHUNKS):
+                try:
+                    chunk = self.audio_queue.popleft()
+                except IndexError:
+                    break
+                batch.append(chunk)
+                batch_samples += chunk[1]
+                if batch_samples >= self._max_batch_samples:
+                    break
+            
+            if not batch:
                 return None
             
+            # Chunks were VAD-gated by the stream handler already. Joining
+            # the buffer views copies the PCM straight into the bytes Vosk
+            # needs, after which the pool buffers can be reused.
+            try:
+                audio_bytes = b''.join([buf[:n] for buf, n in batch])
+            finally:
+                for buf, _ in batch:
+                    self.stream_handler.release_buffer(buf)
+            
             # Process audio using the processor
-            if self.recognizer.AcceptWaveform(audio_data.tobytes()):
+            if self.recognizer.AcceptWaveform(audio_bytes):
                 return self.audio_processor.process_recognition_result(self.recognizer)
             else:
                 return self.audio_processor.process_partial_result(self.recognizer)
                 
-        except queue.Empty:
-            pass
         except Exception as e:
             self.logger.error(f"Error processing audio: {str(e)}")
         return None
@@ -137,17 +246,12 @@ class AudioHandler:
             # Stop recording
             self.is_running = False
             
-            # Clear the audio queue
-            while not self.audio_queue.empty():
-                try:
-                    self.audio_queue.get_nowait()
-                except queue.Empty:
-                    break
-            
             # Clean up the audio stream
             if self.stream:
                 try:
-                    if self.stream.is_active():
+                    if self.audio_backend == "rtmixer":
+                        self.stream.stop()
+                    elif self.stream.is_active():
                         self.stream.stop_stream()
                     self.stream.close()
                     self.stream = None
@@ -155,6 +259,13 @@ class AudioHandler:
                     self.logger.error(f"Error closing stream: {e}")
                     cleanup_successful = False
             
+            # Stop the audio worker once no more callbacks can arrive
+            self.stream_handler.stop()
+            
+            # Clear the audio queue; nothing can append to it any more
+            self.audio_queue.clear()
+            self.stream_handler.close()
+            
             # Clean up PyAudio
             if self.audio:
                 try:
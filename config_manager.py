@@ -3,8 +3,8 @@
 
 import logging
 from typing import Dict, Optional
-import json
 from pathlib import Path
+import orjson
 from logger_config import LoggerConfig
 
 class ConfigManager:
@@ -12,7 +12,8 @@ class ConfigManager:
     DEFAULT_CONFIG_PATH = "config.json"
     
     DEFAULT_CONFIG = {
-        "MODEL_PATH": "./vosk-models/vosk-model-small-en-us-zamia-0.5",
+        "MODEL_PATH": "./vosk-models/vosk-model-small-en-us-0.15",
+        "MODEL_SHA256": None,  # Optional hex digest the downloaded model archive must match
         "SAMPLE_RATE": 48000,
         "CHANNELS": 2,
         "CHUNK_SIZE": 2000,  # Reduced chunk size for better responsiveness. Try 8000.
@@ -21,6 +22,10 @@ class ConfigManager:
         "MIN_PHRASE_MS": 500,
         "MAX_PHRASE_MS": 10000,
         "SILENCE_MS": 300,
+        "AUDIO_BACKEND": "pyaudio",  # "pyaudio", or "rtmixer" to capture without the GIL
+        "SHARED_AUDIO_BUFFERS": False,  # Pool audio chunks in shared memory for a worker process
+        "DECODER_CPUS": None,  # e.g. [0]: pin the decoder there, audio threads elsewhere
+        "AUDIO_THREAD_PRIORITY": None,  # SCHED_FIFO priority (1-99) for the callback, needs root
         "DEBUG_MODE": False
     }
     
@@ -40,8 +45,7 @@ class ConfigManager:
                 )
                 self._create_default_config()
             
-            with open(self.config_path, 'r') as f:
-                config = json.load(f)
+            config = orjson.loads(self.config_path.read_bytes())
                 
             # Validate and merge with defaults
             merged_config = self.DEFAULT_CONFIG.copy()
@@ -50,7 +54,7 @@ class ConfigManager:
             self.logger.info("Configuration loaded successfully")
             return merged_config
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             self.logger.error(f"Invalid JSON in configuration file: {str(e)}")
             return self.DEFAULT_CONFIG.copy()
         except PermissionError as e:
@@ -64,14 +68,18 @@ class ConfigManager:
         """Create default configuration file if it doesn't exist."""
         self.logger.info(f"Creating default configuration file at {self.config_path}")
         self.config_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(self.config_path, 'w') as f:
-            json.dump(self.DEFAULT_CONFIG, f, indent=4)
+        self.config_path.write_bytes(
+            orjson.dumps(self.DEFAULT_CONFIG, option=orjson.OPT_INDENT_2)
+        )
     
     def get_model_path(self) -> str:
         """Get the model path from configuration."""
         return self.config["MODEL_PATH"]
     
+    def get_model_sha256(self) -> Optional[str]:
+        """Get the expected SHA-256 of the model archive, if configured."""
+        return self.config.get("MODEL_SHA256")
+    
     def get_audio_config(self) -> Dict:
         """Get audio-related configuration."""
         return {
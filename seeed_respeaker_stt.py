@@ -14,7 +14,6 @@ import signal
 import sys
 import atexit
 import os
-import psutil
 from audio_handler import AudioHandler
 import logging
 
@@ -79,6 +78,8 @@ class GracefulKiller:
 
 def force_kill_audio_processes():
     """Force kill any hanging audio processes."""
+    import psutil  # Only needed at shutdown
+    
     current_pid = os.getpid()
     current_process = psutil.Process(current_pid)
 
@@ -3,23 +3,32 @@
 from typing import Optional
 
 from pathlib import Path
-import wget
+import hashlib
+import os
+import requests
+import tempfile
 import zipfile
 import shutil
 import logging
 
-def setup_vosk_model(model_path: str) -> Optional[str]:
+DOWNLOAD_BLOCK_SIZE = 1 << 16
+SPOOL_MAX_BYTES = 64 * 1024 * 1024  # Larger archives spill to a temporary file
+
+def setup_vosk_model(model_path: str, expected_sha256: Optional[str] = None) -> Optional[str]:
     """
     Ensures the Vosk model exists at the specified path, downloading it if necessary.
 
+    The archive is streamed into memory (or an anonymous temporary file for large
+    models) and extracted from there, so no zip file is left on disk.
+
     Args:
         model_path: Path to the model directory
+        expected_sha256: Optional SHA-256 hex digest the downloaded archive must match
 
     Returns:
         str: Path to the model directory if successful, None if failed
     """
     model_path = Path(model_path)
-    zip_path = None
     logger = logging.getLogger(__name__)
 
     if model_path.exists():
@@ -35,28 +44,64 @@ def setup_vosk_model(model_path: str) -> Optional[str]:
         download_url = f"{base_url}/{zip_filename}"
 
         logger.info(f"Downloading Vosk model from {download_url}")
-        zip_path = model_path.parent / zip_filename
-        wget.download(download_url, str(zip_path))
-        logger.info("Download completed")
+        with requests.get(download_url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as archive:
+                digest = hashlib.sha256()
+                for block in response.iter_content(chunk_size=DOWNLOAD_BLOCK_SIZE):
+                    digest.update(block)
+                    archive.write(block)
+                logger.info("Download completed")
 
-        logger.info(f"Extracting model to {model_path.parent}")
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(str(model_path.parent))
+                checksum = digest.hexdigest()
+                logger.info(f"Archive SHA-256: {checksum}")
+                if expected_sha256 and checksum != expected_sha256.lower():
+                    raise ValueError(
+                        f"Checksum mismatch for {zip_filename}: expected {expected_sha256}, got {checksum}"
+                    )
 
-        logger.info(f"Removing temporary zip file: {zip_path}")
-        if zip_path.exists():
-            zip_path.unlink()
-            logger.info("Zip file removed successfully")
+                logger.info(f"Extracting model to {model_path.parent}")
+                archive.seek(0)
+                with zipfile.ZipFile(archive) as zip_ref:
+                    zip_ref.extractall(str(model_path.parent))
 
         logger.info("Model setup completed successfully")
         return str(model_path)
 
     except Exception as e:
         logger.error(f"Error setting up Vosk model: {str(e)}")
-        if zip_path and zip_path.exists():
-            logger.info(f"Cleaning up temporary zip file: {zip_path}")
-            zip_path.unlink()
-        if model_path.exists():
+        # Nothing to remove if the download or checksum failed before extraction
+        if model_path.is_dir():
             logger.info(f"Cleaning up partial model directory: {model_path}")
-            shutil.rmtree(model_path)
+            shutil.rmtree(model_path, ignore_errors=True)
         raise
+
+def prefetch_model_files(model_path: str) -> None:
+    """
+    Ask the kernel to start reading the model files into the page cache.
+
+    Loading a model from an SD card is otherwise dominated by cold page-ins.
+    This is only a hint (posix_fadvise WILLNEED) and does nothing on
+    platforms without posix_fadvise.
+
+    Args:
+        model_path: Path to the model directory
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        fadvise = os.posix_fadvise
+        willneed = os.POSIX_FADV_WILLNEED
+    except AttributeError:
+        return
+
+    for path in Path(model_path).rglob('*'):
+        if not path.is_file():
+            continue
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                fadvise(fd, 0, 0, willneed)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.debug(f"Could not prefetch {path}: {e}")